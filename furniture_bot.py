@@ -7,15 +7,19 @@ Telegram бот - Каталог мебели
 """
 
 import logging
-import sqlite3
+import aiosqlite
 import asyncio
 import json
+import msgpack
 import os
 import sys
-from typing import List, Dict, Optional, Any
+import time
+from typing import List, Dict, Optional, Any, Tuple
 from datetime import datetime, timedelta
 from dataclasses import dataclass
 from contextlib import asynccontextmanager
+from collections import OrderedDict
+from functools import lru_cache
 
 # Загрузка переменных окружения
 try:
@@ -35,6 +39,7 @@ from telegram.ext import (
     ConversationHandler, filters, ContextTypes
 )
 from telegram.constants import ParseMode
+from telegram.error import BadRequest, NetworkError, TimedOut
 
 # Настройка логирования для Railway
 logging.basicConfig(
@@ -55,10 +60,22 @@ logger = logging.getLogger(__name__)
 # Конфигурация из переменных окружения
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 ADMIN_IDS_STR = os.getenv("ADMIN_IDS", "")
-ADMIN_IDS = [int(x.strip()) for x in ADMIN_IDS_STR.split(",") if x.strip().isdigit()]
+# Упорядоченный список (для уведомлений и логов) и множество для быстрой проверки
+ADMIN_IDS_LIST = tuple(dict.fromkeys(int(x.strip()) for x in ADMIN_IDS_STR.split(",") if x.strip().isdigit()))
+ADMIN_IDS = frozenset(ADMIN_IDS_LIST)
 DB_NAME = os.getenv("DATABASE_PATH", "furniture_bot.db")
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 
+# Параметры кэширования запросов к базе
+PRODUCT_CACHE_SIZE = 512
+ADMIN_CACHE_SIZE = 1024
+CATEGORIES_CACHE_TTL = 60  # секунд
+PRODUCTS_CACHE_TTL = 30  # секунд
+STATS_CACHE_TTL = 30  # секунд
+
+# Количество товаров на странице категории
+PRODUCTS_PER_PAGE = 10
+
 # Проверка конфигурации
 if not BOT_TOKEN:
     logger.error("❌ BOT_TOKEN не найден в переменных окружения!")
@@ -72,6 +89,34 @@ logger.info(f"📊 База данных: {DB_NAME}")
 logger.info(f"👥 Администраторы: {len(ADMIN_IDS)} ID(s)")
 logger.info(f"🐛 Отладка: {'Включена' if DEBUG else 'Отключена'}")
 
+# Шаблоны сообщений
+PROFILE_TMPL = """
+👤 *Ваш профиль*
+
+🆔 ID: {id}
+👤 Имя: {name}
+📱 Username: @{username}
+📞 Телефон: {phone}
+"""
+
+NEW_ORDER_TMPL = """
+🆕 *НОВЫЙ ЗАКАЗ #{order_id}*
+
+👤 Клиент: {name}
+📱 Username: @{username}
+🆔 ID: {id}
+
+Заказ ожидает обработки!
+"""
+
+# Замена разделителя разрядов на пробел
+_SP_TRANS = str.maketrans({',': ' '})
+
+@lru_cache(maxsize=2048)
+def format_price(price: float) -> str:
+    """Форматирование цены (цены часто повторяются, поэтому результат кэшируется)"""
+    return f"{price:,.0f}".translate(_SP_TRANS) + " ₽"
+
 @dataclass
 class Product:
     """Модель товара"""
@@ -87,6 +132,11 @@ class Product:
     def __post_init__(self):
         if self.images is None:
             self.images = []
+    
+    @property
+    def formatted_price(self) -> str:
+        """Цена в виде строки (format_price кэширует результат)"""
+        return format_price(self.price)
 
 @dataclass
 class User:
@@ -106,21 +156,67 @@ class CartItem:
     quantity: int
     product_name: str
     product_price: float
+    line_total: float = 0.0
 
 class Database:
     """Класс для работы с базой данных"""
     
     def __init__(self, db_name: str = DB_NAME):
         self.db_name = db_name
-        self.init_db()
+        self.conn: Optional[aiosqlite.Connection] = None
+        # Соединение общее, поэтому транзакции (от записи до commit) выполняются под замком
+        self._write_lock = asyncio.Lock()
+        
+        # Кэш товаров по ID (LRU), товаров по категориям и списка категорий (TTL)
+        self._product_cache: "OrderedDict[int, Product]" = OrderedDict()
+        self._products_cache: Dict[Tuple[str, int, int], Tuple[float, List[Product]]] = {}
+        self._products_count_cache: Dict[str, Tuple[float, int]] = {}
+        self._categories_cache: Optional[List[Dict]] = None
+        self._categories_cache_ts = 0.0
+        
+        # Кэш статистики магазина: (время, результат get_stats)
+        self._stats_cache: Optional[Tuple[float, Tuple[int, int, int, List[Tuple[str, int]]]]] = None
+    
+    async def connect(self):
+        """Открыть общее соединение с базой данных"""
+        # Кэш подготовленных выражений: все запросы параметризованы и повторяются
+        self.conn = await aiosqlite.connect(self.db_name, cached_statements=256)
+        await self.conn.executescript('''
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            PRAGMA temp_store = MEMORY;
+            PRAGMA cache_size = -64000;
+            PRAGMA mmap_size = 268435456;
+        ''')
+        await self.init_db()
+    
+    async def close(self):
+        """Закрыть соединение с базой данных"""
+        if self.conn is not None:
+            await self.conn.close()
+            self.conn = None
+    
+    @asynccontextmanager
+    async def _transaction(self):
+        """Транзакция на общем соединении: под замком, commit при успехе, rollback при ошибке"""
+        async with self._write_lock:
+            await self.conn.execute('BEGIN')
+            try:
+                yield
+                await self.conn.commit()
+            except BaseException:
+                await self.conn.rollback()
+                raise
     
-    def init_db(self):
+    async def init_db(self):
         """Инициализация базы данных"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
+        async with self._transaction():
+            await self._init_db()
+    
+    async def _init_db(self):
+        """Создание схемы и начальных данных (вызывается внутри транзакции)"""
         # Таблица пользователей
-        cursor.execute('''
+        await self.conn.execute('''
             CREATE TABLE IF NOT EXISTS users (
                 id INTEGER PRIMARY KEY,
                 username TEXT,
@@ -133,21 +229,34 @@ class Database:
         ''')
         
         # Таблица товаров
-        cursor.execute('''
+        await self.conn.execute('''
             CREATE TABLE IF NOT EXISTS products (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 name TEXT NOT NULL,
                 description TEXT,
                 price REAL NOT NULL,
                 category TEXT NOT NULL,
-                images TEXT,  -- JSON массив
+                images BLOB,  -- msgpack массив
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 is_active BOOLEAN DEFAULT TRUE
             )
         ''')
         
+        # Перевод изображений из старого формата JSON в msgpack
+        async with self.conn.execute(
+            "SELECT id, images FROM products WHERE typeof(images) = 'text'"
+        ) as cursor:
+            legacy_rows = await cursor.fetchall()
+        
+        if legacy_rows:
+            await self.conn.executemany(
+                'UPDATE products SET images = ? WHERE id = ?',
+                [(msgpack.packb(json.loads(images) if images else []), product_id)
+                 for product_id, images in legacy_rows]
+            )
+        
         # Таблица корзины
-        cursor.execute('''
+        await self.conn.execute('''
             CREATE TABLE IF NOT EXISTS cart (
                 user_id INTEGER,
                 product_id INTEGER,
@@ -159,7 +268,7 @@ class Database:
         ''')
         
         # Таблица заказов
-        cursor.execute('''
+        await self.conn.execute('''
             CREATE TABLE IF NOT EXISTS orders (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id INTEGER,
@@ -175,7 +284,7 @@ class Database:
         ''')
         
         # Таблица категорий
-        cursor.execute('''
+        await self.conn.execute('''
             CREATE TABLE IF NOT EXISTS categories (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 name TEXT UNIQUE NOT NULL,
@@ -184,6 +293,19 @@ class Database:
             )
         ''')
         
+        # Индексы для выборки товаров категории и списка заказов
+        # (id в индексе товаров задает порядок при одинаковом created_at)
+        await self.conn.execute('DROP INDEX IF EXISTS idx_products_cat_active')
+        await self.conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_products_cat_active_created
+            ON products (category, is_active, created_at DESC, id DESC)
+        ''')
+        
+        await self.conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_orders_created
+            ON orders (created_at DESC)
+        ''')
+        
         # Добавляем базовые категории
         categories = [
             ('Диваны и кресла', 'Мягкая мебель для гостиной', '🛋️'),
@@ -194,22 +316,19 @@ class Database:
             ('Офисная мебель', 'Мебель для работы', '💼')
         ]
         
-        cursor.executemany('''
-            INSERT OR IGNORE INTO categories (name, description, emoji) 
-            VALUES (?, ?, ?)
-        ''', categories)
+        async with self.conn.execute('SELECT COUNT(*) FROM categories') as cursor:
+            categories_count = (await cursor.fetchone())[0]
         
-        conn.commit()
-        conn.close()
+        if categories_count < len(categories):
+            await self.conn.executemany('''
+                INSERT OR IGNORE INTO categories (name, description, emoji) 
+                VALUES (?, ?, ?)
+            ''', categories)
     
-    def get_user(self, user_id: int) -> Optional[User]:
+    async def get_user(self, user_id: int) -> Optional[User]:
         """Получить пользователя по ID"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
-        row = cursor.fetchone()
-        conn.close()
+        async with self.conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)) as cursor:
+            row = await cursor.fetchone()
         
         if row:
             return User(
@@ -219,178 +338,253 @@ class Database:
             )
         return None
     
-    def save_user(self, user: User):
+    async def save_user(self, user: User):
         """Сохранить пользователя"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT OR REPLACE INTO users 
-            (id, username, first_name, last_name, phone, is_admin) 
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (user.id, user.username, user.first_name, user.last_name, 
-              user.phone, user.is_admin))
-        
-        conn.commit()
-        conn.close()
-    
-    def get_categories(self) -> List[Dict]:
+        async with self._transaction():
+            await self.conn.execute('''
+                INSERT INTO users 
+                (id, username, first_name, last_name, phone, is_admin) 
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    username = excluded.username,
+                    first_name = excluded.first_name,
+                    last_name = excluded.last_name,
+                    phone = COALESCE(excluded.phone, phone),
+                    is_admin = excluded.is_admin
+                WHERE username IS NOT excluded.username
+                   OR first_name IS NOT excluded.first_name
+                   OR last_name IS NOT excluded.last_name
+                   OR phone IS NOT COALESCE(excluded.phone, phone)
+                   OR is_admin IS NOT excluded.is_admin
+            ''', (user.id, user.username, user.first_name, user.last_name, 
+                  user.phone, user.is_admin))
+    
+    async def get_categories(self) -> List[Dict]:
         """Получить все категории"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        if (self._categories_cache is not None
+                and time.monotonic() - self._categories_cache_ts < CATEGORIES_CACHE_TTL):
+            return self._categories_cache
         
-        cursor.execute('SELECT name, description, emoji FROM categories ORDER BY name')
-        rows = cursor.fetchall()
-        conn.close()
+        async with self.conn.execute('SELECT id, name, description, emoji FROM categories ORDER BY name') as cursor:
+            rows = await cursor.fetchall()
         
-        return [{'name': row[0], 'description': row[1], 'emoji': row[2]} for row in rows]
-    
-    def get_products_by_category(self, category: str) -> List[Product]:
-        """Получить товары по категории"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, name, description, price, category, images, created_at, is_active 
+        self._categories_cache = [
+            {'id': row[0], 'name': row[1], 'description': row[2], 'emoji': row[3]} for row in rows
+        ]
+        self._categories_cache_ts = time.monotonic()
+        return self._categories_cache
+    
+    async def get_products_by_category(self, category: str, limit: int = PRODUCTS_PER_PAGE,
+                                       offset: int = 0) -> List[Product]:
+        """Получить страницу товаров категории (для списка: без описания и изображений)"""
+        key = (category, limit, offset)
+        cached = self._products_cache.get(key)
+        if cached and time.monotonic() - cached[0] < PRODUCTS_CACHE_TTL:
+            return cached[1]
+        
+        async with self.conn.execute('''
+            SELECT id, name, price 
             FROM products WHERE category = ? AND is_active = TRUE 
-            ORDER BY created_at DESC
-        ''', (category,))
+            ORDER BY created_at DESC, id DESC
+            LIMIT ? OFFSET ?
+        ''', (category, limit, offset)) as cursor:
+            rows = await cursor.fetchall()
+        
+        products = [
+            Product(id=row[0], name=row[1], price=row[2], category=category)
+            for row in rows
+        ]
         
-        rows = cursor.fetchall()
-        conn.close()
+        self._products_cache[key] = (time.monotonic(), products)
+        return products
+    
+    async def count_products_by_category(self, category: str) -> int:
+        """Количество активных товаров в категории"""
+        cached = self._products_count_cache.get(category)
+        if cached and time.monotonic() - cached[0] < PRODUCTS_CACHE_TTL:
+            return cached[1]
         
-        products = []
-        for row in rows:
-            images = json.loads(row[5]) if row[5] else []
-            products.append(Product(
-                id=row[0], name=row[1], description=row[2], price=row[3],
-                category=row[4], images=images, created_at=row[6], is_active=bool(row[7])
-            ))
+        async with self.conn.execute(
+            'SELECT COUNT(*) FROM products WHERE category = ? AND is_active = TRUE', (category,)
+        ) as cursor:
+            count = (await cursor.fetchone())[0]
         
-        return products
+        self._products_count_cache[category] = (time.monotonic(), count)
+        return count
     
-    def get_product_by_id(self, product_id: int) -> Optional[Product]:
+    async def get_product_by_id(self, product_id: int) -> Optional[Product]:
         """Получить товар по ID"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        product = self._product_cache.get(product_id)
+        if product is not None:
+            self._product_cache.move_to_end(product_id)
+            return product
         
-        cursor.execute('''
+        async with self.conn.execute('''
             SELECT id, name, description, price, category, images, created_at, is_active 
             FROM products WHERE id = ?
-        ''', (product_id,))
-        
-        row = cursor.fetchone()
-        conn.close()
+        ''', (product_id,)) as cursor:
+            row = await cursor.fetchone()
         
         if row:
-            images = json.loads(row[5]) if row[5] else []
-            return Product(
+            images = msgpack.unpackb(row[5]) if row[5] else []
+            product = Product(
                 id=row[0], name=row[1], description=row[2], price=row[3],
                 category=row[4], images=images, created_at=row[6], is_active=bool(row[7])
             )
+            self._product_cache[product_id] = product
+            if len(self._product_cache) > PRODUCT_CACHE_SIZE:
+                self._product_cache.popitem(last=False)
+            return product
         return None
     
-    def save_product(self, product: Product) -> int:
+    async def save_product(self, product: Product) -> int:
         """Сохранить товар"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        images_json = json.dumps(product.images)
-        
-        if product.id:
-            cursor.execute('''
-                UPDATE products SET name = ?, description = ?, price = ?, 
-                category = ?, images = ?, is_active = ? WHERE id = ?
-            ''', (product.name, product.description, product.price, 
-                  product.category, images_json, product.is_active, product.id))
-            product_id = product.id
-        else:
-            cursor.execute('''
+        images_blob = msgpack.packb(product.images)
+        
+        async with self._transaction():
+            if product.id:
+                await self.conn.execute('''
+                    UPDATE products SET name = ?, description = ?, price = ?, 
+                    category = ?, images = ?, is_active = ? WHERE id = ?
+                ''', (product.name, product.description, product.price, 
+                      product.category, images_blob, product.is_active, product.id))
+                product_id = product.id
+            else:
+                cursor = await self.conn.execute('''
+                    INSERT INTO products (name, description, price, category, images, is_active) 
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (product.name, product.description, product.price, 
+                      product.category, images_blob, product.is_active))
+                product_id = cursor.lastrowid
+        
+        self.invalidate_product(product_id)
+        return product_id
+    
+    async def save_products_bulk(self, products: List[Product]):
+        """Сохранить несколько новых товаров одной транзакцией"""
+        rows = [
+            (p.name, p.description, p.price, p.category, msgpack.packb(p.images), p.is_active)
+            for p in products
+        ]
+        
+        async with self._transaction():
+            await self.conn.executemany('''
                 INSERT INTO products (name, description, price, category, images, is_active) 
                 VALUES (?, ?, ?, ?, ?, ?)
-            ''', (product.name, product.description, product.price, 
-                  product.category, images_json, product.is_active))
-            product_id = cursor.lastrowid
+            ''', rows)
         
-        conn.commit()
-        conn.close()
-        return product_id
+        self._products_cache.clear()
+        self._products_count_cache.clear()
+        self._stats_cache = None
     
-    def delete_product(self, product_id: int):
+    async def delete_product(self, product_id: int):
         """Удалить товар (мягкое удаление)"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute('UPDATE products SET is_active = FALSE WHERE id = ?', (product_id,))
+        async with self._transaction():
+            await self.conn.execute('UPDATE products SET is_active = FALSE WHERE id = ?', (product_id,))
+        self.invalidate_product(product_id)
+    
+    def invalidate_product(self, product_id: int):
+        """Сбросить кэш после изменения товара"""
+        self._product_cache.pop(product_id, None)
+        # Товар мог сменить категорию, поэтому сбрасываем списки целиком
+        self._products_cache.clear()
+        self._products_count_cache.clear()
+        self._stats_cache = None
+    
+    async def get_cart_with_total(self, user_id: int) -> Tuple[List[CartItem], float]:
+        """Получить товары из корзины и общую сумму"""
+        async with self.conn.execute('''
+            SELECT c.product_id, c.quantity, p.name, p.price,
+                   c.quantity * p.price AS line_total,
+                   SUM(c.quantity * p.price) OVER () AS total
+            FROM cart c 
+            JOIN products p ON c.product_id = p.id 
+            WHERE c.user_id = ? AND p.is_active = TRUE
+        ''', (user_id,)) as cursor:
+            rows = await cursor.fetchall()
         
-        conn.commit()
-        conn.close()
+        total = rows[0][5] if rows else 0.0
+        return [CartItem(row[0], row[1], row[2], row[3], row[4]) for row in rows], total
     
-    def get_cart_items(self, user_id: int) -> List[CartItem]:
-        """Получить товары из корзины"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT c.product_id, c.quantity, p.name, p.price 
+    async def get_cart_total(self, user_id: int) -> float:
+        """Получить сумму товаров в корзине"""
+        async with self.conn.execute('''
+            SELECT COALESCE(SUM(c.quantity * p.price), 0.0) 
             FROM cart c 
             JOIN products p ON c.product_id = p.id 
             WHERE c.user_id = ? AND p.is_active = TRUE
-        ''', (user_id,))
-        
-        rows = cursor.fetchall()
-        conn.close()
-        
-        return [CartItem(row[0], row[1], row[2], row[3]) for row in rows]
+        ''', (user_id,)) as cursor:
+            return (await cursor.fetchone())[0]
     
-    def add_to_cart(self, user_id: int, product_id: int, quantity: int = 1):
+    async def add_to_cart(self, user_id: int, product_id: int, quantity: int = 1):
         """Добавить товар в корзину"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT OR REPLACE INTO cart (user_id, product_id, quantity) 
-            VALUES (?, ?, COALESCE((SELECT quantity FROM cart WHERE user_id = ? AND product_id = ?), 0) + ?)
-        ''', (user_id, product_id, user_id, product_id, quantity))
-        
-        conn.commit()
-        conn.close()
-    
-    def remove_from_cart(self, user_id: int, product_id: int):
+        async with self._transaction():
+            await self.conn.execute('''
+                INSERT INTO cart (user_id, product_id, quantity) 
+                VALUES (?, ?, ?)
+                ON CONFLICT (user_id, product_id) DO UPDATE SET quantity = quantity + excluded.quantity
+            ''', (user_id, product_id, quantity))
+    
+    async def remove_from_cart(self, user_id: int, product_id: int):
         """Удалить товар из корзины"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute('DELETE FROM cart WHERE user_id = ? AND product_id = ?', (user_id, product_id))
-        
-        conn.commit()
-        conn.close()
+        async with self._transaction():
+            await self.conn.execute('DELETE FROM cart WHERE user_id = ? AND product_id = ?', (user_id, product_id))
     
-    def clear_cart(self, user_id: int):
+    async def clear_cart(self, user_id: int):
         """Очистить корзину"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute('DELETE FROM cart WHERE user_id = ?', (user_id,))
+        async with self._transaction():
+            await self.conn.execute('DELETE FROM cart WHERE user_id = ?', (user_id,))
+    
+    async def create_order_and_clear(self, user_id: int, products: List[Dict], total: float, 
+                                     phone: str, address: str, comment: str = "") -> int:
+        """Создать заказ и очистить корзину одной транзакцией"""
+        async with self._transaction():
+            cursor = await self.conn.execute('''
+                INSERT INTO orders (user_id, products, total_amount, phone, address, comment) 
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (user_id, json.dumps(products), total, phone, address, comment))
+            await self.conn.execute('DELETE FROM cart WHERE user_id = ?', (user_id,))
         
-        conn.commit()
-        conn.close()
+        self._stats_cache = None
+        return cursor.lastrowid
     
-    def create_order(self, user_id: int, products: List[Dict], total: float, 
-                    phone: str, address: str, comment: str = "") -> int:
-        """Создать заказ"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+    async def get_stats(self) -> Tuple[int, int, int, List[Tuple[str, int]]]:
+        """Статистика магазина: товары, пользователи, заказы и товары по категориям"""
+        if self._stats_cache and time.monotonic() - self._stats_cache[0] < STATS_CACHE_TTL:
+            return self._stats_cache[1]
         
-        cursor.execute('''
-            INSERT INTO orders (user_id, products, total_amount, phone, address, comment) 
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (user_id, json.dumps(products), total, phone, address, comment))
+        async with self.conn.execute('''
+            SELECT (SELECT COUNT(*) FROM users),
+                   (SELECT COUNT(*) FROM orders)
+        ''') as cursor:
+            users_count, orders_count = await cursor.fetchone()
         
-        order_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return order_id
+        # Один проход по товарам: общее количество — сумма по категориям
+        async with self.conn.execute('''
+            SELECT category, COUNT(*) 
+            FROM products 
+            WHERE is_active = TRUE 
+            GROUP BY category
+        ''') as cursor:
+            categories_stats = await cursor.fetchall()
+        products_count = sum(count for _, count in categories_stats)
+        
+        stats = (products_count, users_count, orders_count, categories_stats)
+        self._stats_cache = (time.monotonic(), stats)
+        return stats
+    
+    async def get_recent_orders(self, limit: int = 10) -> List[Tuple]:
+        """Последние заказы с данными клиента"""
+        async with self.conn.execute('''
+            SELECT o.id, o.total_amount, o.phone,
+                   strftime('%d.%m.%Y %H:%M', o.created_at) AS date, o.status,
+                   u.first_name, u.username
+            FROM orders o
+            LEFT JOIN users u ON o.user_id = u.id
+            ORDER BY o.created_at DESC
+            LIMIT ?
+        ''', (limit,)) as cursor:
+            return await cursor.fetchall()
 
 # Инициализация базы данных
 db = Database()
@@ -401,32 +595,102 @@ class FurnitureBot:
     def __init__(self):
         self.db = db
         self.user_states = {}  # Временное хранилище состояний
-    
-    def is_admin(self, user_id: int) -> bool:
-        """Проверка прав администратора"""
-        user = self.db.get_user(user_id)
-        return user_id in ADMIN_IDS or (user and user.is_admin)
-    
-    def format_price(self, price: float) -> str:
-        """Форматирование цены"""
-        return f"{price:,.0f} ₽".replace(",", " ")
-    
-    def get_main_keyboard(self, user_id: int) -> InlineKeyboardMarkup:
-        """Главная клавиатура"""
-        keyboard = [
+        self._admin_cache: "OrderedDict[int, bool]" = OrderedDict()  # Права из базы по user_id (LRU)
+        self._categories_markup: Optional[InlineKeyboardMarkup] = None
+        self._category_by_id: Dict[int, str] = {}
+        self._category_id: Dict[str, int] = {}
+        
+        # Статические клавиатуры собираются один раз
+        main_rows = [
             [InlineKeyboardButton("📋 Каталог", callback_data="catalog")],
             [InlineKeyboardButton("🛒 Корзина", callback_data="cart"),
              InlineKeyboardButton("👤 Профиль", callback_data="profile")],
         ]
-        
-        if self.is_admin(user_id):
-            keyboard.append([InlineKeyboardButton("⚙️ Админ панель", callback_data="admin")])
-        
-        return InlineKeyboardMarkup(keyboard)
+        self._main_keyboard_user = InlineKeyboardMarkup(main_rows)
+        self._main_keyboard_admin = InlineKeyboardMarkup(
+            main_rows + [[InlineKeyboardButton("⚙️ Админ панель", callback_data="admin")]]
+        )
+        self._admin_keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton("➕ Добавить товар", callback_data="add_product")],
+            [InlineKeyboardButton("📋 Управление товарами", callback_data="manage_products")],
+            [InlineKeyboardButton("📊 Статистика", callback_data="admin_stats"),
+             InlineKeyboardButton("📋 Заказы", callback_data="admin_orders")],
+            [InlineKeyboardButton("📋 Каталог", callback_data="catalog"),
+             InlineKeyboardButton("🏠 Главная", callback_data="main_menu")]
+        ])
+        self._kb_back_home = InlineKeyboardMarkup([
+            [InlineKeyboardButton("🏠 Главная", callback_data="main_menu")]
+        ])
+        self._kb_admin_back = InlineKeyboardMarkup([
+            [InlineKeyboardButton("⚙️ Админ панель", callback_data="admin")],
+            [InlineKeyboardButton("🏠 Главная", callback_data="main_menu")]
+        ])
+        self._kb_cart_empty = InlineKeyboardMarkup([
+            [InlineKeyboardButton("📋 Каталог", callback_data="catalog")],
+            [InlineKeyboardButton("🏠 Главная", callback_data="main_menu")]
+        ])
+        self._kb_cart = InlineKeyboardMarkup([
+            [InlineKeyboardButton("🚚 Оформить заказ", callback_data="checkout")],
+            [InlineKeyboardButton("🗑️ Очистить корзину", callback_data="clear_cart")],
+            [InlineKeyboardButton("📋 Продолжить покупки", callback_data="catalog")],
+            [InlineKeyboardButton("🏠 Главная", callback_data="main_menu")]
+        ])
+        self._kb_profile = InlineKeyboardMarkup([
+            [InlineKeyboardButton("📞 Изменить телефон", callback_data="change_phone")],
+            [InlineKeyboardButton("🏠 Главная", callback_data="main_menu")]
+        ])
+        self._kb_error = InlineKeyboardMarkup([
+            [InlineKeyboardButton("🏠 Главная", callback_data="main_menu")],
+            [InlineKeyboardButton("📋 Каталог", callback_data="catalog")]
+        ])
     
-    def get_categories_keyboard(self) -> InlineKeyboardMarkup:
+    async def is_admin(self, user_id: int) -> bool:
+        """Проверка прав администратора"""
+        if user_id in ADMIN_IDS:
+            return True
+        return await self._db_is_admin(user_id)
+    
+    async def _db_is_admin(self, user_id: int) -> bool:
+        """Проверка флага администратора в базе (с кэшем)"""
+        is_admin = self._admin_cache.get(user_id)
+        if is_admin is not None:
+            self._admin_cache.move_to_end(user_id)
+            return is_admin
+        
+        user = await self.db.get_user(user_id)
+        is_admin = bool(user and user.is_admin)
+        self._admin_cache[user_id] = is_admin
+        if len(self._admin_cache) > ADMIN_CACHE_SIZE:
+            self._admin_cache.popitem(last=False)
+        return is_admin
+    
+    async def get_main_keyboard(self, user_id: int) -> InlineKeyboardMarkup:
+        """Главная клавиатура"""
+        if await self.is_admin(user_id):
+            return self._main_keyboard_admin
+        return self._main_keyboard_user
+    
+    async def get_categories_keyboard(self) -> InlineKeyboardMarkup:
         """Клавиатура категорий"""
-        categories = self.db.get_categories()
+        await self._load_categories()
+        return self._categories_markup
+    
+    def invalidate_categories(self):
+        """Сбросить клавиатуру категорий после их изменения"""
+        self._categories_markup = None
+    
+    async def _load_categories(self):
+        """Загрузить категории: клавиатуру и соответствие ID <-> название"""
+        if self._categories_markup is not None:
+            return
+        
+        categories = await self.db.get_categories()
+        self._category_by_id = {cat['id']: cat['name'] for cat in categories}
+        self._category_id = {cat['name']: cat['id'] for cat in categories}
+        self._categories_markup = self._build_categories_markup(categories)
+    
+    def _build_categories_markup(self, categories: List[Dict]) -> InlineKeyboardMarkup:
+        """Собрать клавиатуру категорий"""
         keyboard = []
         
         # Распределяем категории по 2 в ряд
@@ -436,36 +700,36 @@ class FurnitureBot:
                 cat = categories[j]
                 row.append(InlineKeyboardButton(
                     f"{cat['emoji']} {cat['name']}", 
-                    callback_data=f"category_{cat['name']}"
+                    callback_data=f"c{cat['id']}"
                 ))
             keyboard.append(row)
         
         keyboard.append([InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")])
         return InlineKeyboardMarkup(keyboard)
     
-    def get_products_keyboard(self, category: str, page: int = 0) -> InlineKeyboardMarkup:
+    async def get_products_keyboard(self, category: str, page: int = 0,
+                                    products: Optional[List[Product]] = None) -> InlineKeyboardMarkup:
         """Клавиатура товаров категории"""
-        products = self.db.get_products_by_category(category)
+        # Пагинация по PRODUCTS_PER_PAGE товаров на странице
+        offset = page * PRODUCTS_PER_PAGE
+        if products is None:
+            products = await self.db.get_products_by_category(category, PRODUCTS_PER_PAGE, offset)
         keyboard = []
         
-        # Пагинация по 10 товаров на странице
-        items_per_page = 10
-        start_idx = page * items_per_page
-        end_idx = start_idx + items_per_page
-        page_products = products[start_idx:end_idx]
-        
-        for product in page_products:
+        for product in products:
             keyboard.append([InlineKeyboardButton(
-                f"{product.name} - {self.format_price(product.price)}", 
+                f"{product.name} - {product.formatted_price}", 
                 callback_data=f"product_{product.id}"
             )])
         
         # Навигация по страницам
+        await self._load_categories()
+        category_id = self._category_id.get(category)
         nav_row = []
         if page > 0:
-            nav_row.append(InlineKeyboardButton("⬅️", callback_data=f"products_{category}_{page-1}"))
-        if end_idx < len(products):
-            nav_row.append(InlineKeyboardButton("➡️", callback_data=f"products_{category}_{page+1}"))
+            nav_row.append(InlineKeyboardButton("⬅️", callback_data=f"p{category_id}:{page-1}"))
+        if offset + PRODUCTS_PER_PAGE < await self.db.count_products_by_category(category):
+            nav_row.append(InlineKeyboardButton("➡️", callback_data=f"p{category_id}:{page+1}"))
         
         if nav_row:
             keyboard.append(nav_row)
@@ -477,14 +741,14 @@ class FurnitureBot:
         
         return InlineKeyboardMarkup(keyboard)
     
-    def get_product_keyboard(self, product_id: int, user_id: int) -> InlineKeyboardMarkup:
+    async def get_product_keyboard(self, product_id: int, user_id: int) -> InlineKeyboardMarkup:
         """Клавиатура просмотра товара"""
         keyboard = [
             [InlineKeyboardButton("🛒 В корзину", callback_data=f"add_cart_{product_id}")],
             [InlineKeyboardButton("📋 К товарам", callback_data="back_to_products")],
         ]
         
-        if self.is_admin(user_id):
+        if await self.is_admin(user_id):
             keyboard.insert(1, [
                 InlineKeyboardButton("✏️ Редактировать", callback_data=f"edit_product_{product_id}"),
                 InlineKeyboardButton("🗑️ Удалить", callback_data=f"delete_product_{product_id}")
@@ -494,29 +758,28 @@ class FurnitureBot:
     
     def get_admin_keyboard(self) -> InlineKeyboardMarkup:
         """Админ клавиатура"""
-        keyboard = [
-            [InlineKeyboardButton("➕ Добавить товар", callback_data="add_product")],
-            [InlineKeyboardButton("📋 Управление товарами", callback_data="manage_products")],
-            [InlineKeyboardButton("📊 Статистика", callback_data="admin_stats"),
-             InlineKeyboardButton("📋 Заказы", callback_data="admin_orders")],
-            [InlineKeyboardButton("📋 Каталог", callback_data="catalog"),
-             InlineKeyboardButton("🏠 Главная", callback_data="main_menu")]
-        ]
-        return InlineKeyboardMarkup(keyboard)
+        return self._admin_keyboard
     
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Команда /start"""
         user = update.effective_user
         
-        # Регистрируем пользователя
-        db_user = User(
-            id=user.id,
-            username=user.username,
-            first_name=user.first_name,
-            last_name=user.last_name,
-            is_admin=user.id in ADMIN_IDS
-        )
-        self.db.save_user(db_user)
+        # Регистрируем пользователя, если он новый, сменил данные или изменился ADMIN_IDS
+        existing = await self.db.get_user(user.id)
+        if not (existing
+                and existing.username == user.username
+                and existing.first_name == user.first_name
+                and existing.last_name == user.last_name
+                and existing.is_admin == (user.id in ADMIN_IDS)):
+            db_user = User(
+                id=user.id,
+                username=user.username,
+                first_name=user.first_name,
+                last_name=user.last_name,
+                is_admin=user.id in ADMIN_IDS
+            )
+            await self.db.save_user(db_user)
+            self._admin_cache.pop(user.id, None)
         
         welcome_text = f"""
 🌟 *Добро пожаловать в каталог мебели!*
@@ -534,7 +797,7 @@ class FurnitureBot:
         await update.message.reply_text(
             welcome_text,
             parse_mode=ParseMode.MARKDOWN,
-            reply_markup=self.get_main_keyboard(user.id)
+            reply_markup=await self.get_main_keyboard(user.id)
         )
         
         return MAIN_MENU
@@ -556,7 +819,7 @@ class FurnitureBot:
         await query.edit_message_text(
             text,
             parse_mode=ParseMode.MARKDOWN,
-            reply_markup=self.get_main_keyboard(user.id)
+            reply_markup=await self.get_main_keyboard(user.id)
         )
         
         return MAIN_MENU
@@ -575,7 +838,7 @@ class FurnitureBot:
         await query.edit_message_text(
             text,
             parse_mode=ParseMode.MARKDOWN,
-            reply_markup=self.get_categories_keyboard()
+            reply_markup=await self.get_categories_keyboard()
         )
         
         return CATALOG
@@ -585,20 +848,26 @@ class FurnitureBot:
         query = update.callback_query
         await query.answer()
         
+        # Формат данных: c{id категории} или p{id категории}:{страница}
         callback_data = query.data
         
-        if callback_data.startswith("category_"):
-            category = callback_data.replace("category_", "")
-            page = 0
-        elif callback_data.startswith("products_"):
-            parts = callback_data.split("_")
-            category = "_".join(parts[1:-1])
-            page = int(parts[-1])
+        if callback_data[0] == "c":
+            category_id, page = int(callback_data[1:]), 0
+        else:
+            category_id, _, page = callback_data[1:].partition(":")
+            category_id, page = int(category_id), int(page)
+        
+        await self._load_categories()
+        category = self._category_by_id.get(category_id)
+        if category is None:
+            return await self.catalog(update, context)
         
         # Сохраняем текущую категорию
         context.user_data['current_category'] = category
         
-        products = self.db.get_products_by_category(category)
+        products = await self.db.get_products_by_category(
+            category, PRODUCTS_PER_PAGE, page * PRODUCTS_PER_PAGE
+        )
         
         if not products:
             text = f"📋 *{category}*\n\nВ этой категории пока нет товаров."
@@ -608,7 +877,7 @@ class FurnitureBot:
         await query.edit_message_text(
             text,
             parse_mode=ParseMode.MARKDOWN,
-            reply_markup=self.get_products_keyboard(category, page)
+            reply_markup=await self.get_products_keyboard(category, page, products)
         )
         
         return CATALOG
@@ -619,7 +888,7 @@ class FurnitureBot:
         await query.answer()
         
         product_id = int(query.data.replace("product_", ""))
-        product = self.db.get_product_by_id(product_id)
+        product = await self.db.get_product_by_id(product_id)
         
         if not product:
             await query.edit_message_text("❌ Товар не найден")
@@ -627,54 +896,67 @@ class FurnitureBot:
         
         # Сохраняем ID товара
         context.user_data['current_product'] = product_id
+        context.user_data['current_product_obj'] = {'id': product.id, 'name': product.name}
         
         text = f"""
 🛋️ *{product.name}*
 
 📝 {product.description}
 
-💰 *Цена: {self.format_price(product.price)}*
+💰 *Цена: {product.formatted_price}*
 
 🏷️ Категория: {product.category}
 """
         
         if product.images:
+            chat_id = query.message.chat.id
+            keyboard = await self.get_product_keyboard(product_id, query.from_user.id)
+            
             try:
-                # Отправляем первое изображение с описанием
-                await context.bot.send_photo(
-                    chat_id=query.message.chat.id,
-                    photo=product.images[0],
-                    caption=text,
-                    parse_mode=ParseMode.MARKDOWN,
-                    reply_markup=self.get_product_keyboard(product_id, query.from_user.id)
-                )
-                
-                # Если есть дополнительные изображения, отправляем их
-                if len(product.images) > 1:
-                    media_group = []
-                    for img_url in product.images[1:]:
-                        media_group.append(InputMediaPhoto(media=img_url))
-                    
-                    await context.bot.send_media_group(
-                        chat_id=query.message.chat.id,
-                        media=media_group
+                if len(product.images) == 1:
+                    # Одно изображение - отправляем его вместе с описанием и клавиатурой
+                    await context.bot.send_photo(
+                        chat_id=chat_id,
+                        photo=product.images[0],
+                        caption=text,
+                        parse_mode=ParseMode.MARKDOWN,
+                        reply_markup=keyboard
                     )
-                
-                # Удаляем предыдущее сообщение
-                await query.delete_message()
-                
+                else:
+                    # Все изображения (до 10) одним альбомом, описание в подписи к первому
+                    media_group = [InputMediaPhoto(
+                        media=product.images[0], caption=text, parse_mode=ParseMode.MARKDOWN
+                    )]
+                    media_group.extend(InputMediaPhoto(media=img) for img in product.images[1:10])
+                    
+                    await context.bot.send_media_group(chat_id=chat_id, media=media_group)
             except Exception as e:
                 logger.error(f"Error sending product images: {e}")
                 await query.edit_message_text(
                     text,
                     parse_mode=ParseMode.MARKDOWN,
-                    reply_markup=self.get_product_keyboard(product_id, query.from_user.id)
+                    reply_markup=keyboard
                 )
+                return PRODUCT_VIEW
+            
+            # Изображения отправлены - удаляем предыдущее сообщение. Альбом не поддерживает
+            # клавиатуру, поэтому одновременно отправляем ее отдельным сообщением
+            actions = [query.delete_message()]
+            if len(product.images) > 1:
+                actions.append(context.bot.send_message(
+                    chat_id=chat_id,
+                    text="Выберите действие:",
+                    reply_markup=keyboard
+                ))
+            
+            for result in await asyncio.gather(*actions, return_exceptions=True):
+                if isinstance(result, Exception):
+                    logger.warning(f"Error finishing product view: {result}")
         else:
             await query.edit_message_text(
                 text,
                 parse_mode=ParseMode.MARKDOWN,
-                reply_markup=self.get_product_keyboard(product_id, query.from_user.id)
+                reply_markup=await self.get_product_keyboard(product_id, query.from_user.id)
             )
         
         return PRODUCT_VIEW
@@ -687,14 +969,20 @@ class FurnitureBot:
         product_id = int(query.data.replace("add_cart_", ""))
         user_id = query.from_user.id
         
-        product = self.db.get_product_by_id(product_id)
-        if not product:
-            await query.answer("❌ Товар не найден", show_alert=True)
-            return PRODUCT_VIEW
+        # Название берем из просмотренного товара, без повторного запроса к базе
+        current = context.user_data.get('current_product_obj')
+        if current and current['id'] == product_id:
+            product_name = current['name']
+        else:
+            product = await self.db.get_product_by_id(product_id)
+            if not product:
+                await query.answer("❌ Товар не найден", show_alert=True)
+                return PRODUCT_VIEW
+            product_name = product.name
         
         try:
-            self.db.add_to_cart(user_id, product_id)
-            await query.answer(f"✅ {product.name} добавлен в корзину!", show_alert=True)
+            await self.db.add_to_cart(user_id, product_id)
+            await query.answer(f"✅ {product_name} добавлен в корзину!", show_alert=True)
         except Exception as e:
             logger.error(f"Error adding to cart: {e}")
             await query.answer("❌ Ошибка при добавлении в корзину", show_alert=True)
@@ -707,37 +995,26 @@ class FurnitureBot:
         await query.answer()
         
         user_id = query.from_user.id
-        cart_items = self.db.get_cart_items(user_id)
+        cart_items, total = await self.db.get_cart_with_total(user_id)
         
         if not cart_items:
             text = "🛒 *Корзина пуста*\n\nДобавьте товары из каталога!"
-            keyboard = [
-                [InlineKeyboardButton("📋 Каталог", callback_data="catalog")],
-                [InlineKeyboardButton("🏠 Главная", callback_data="main_menu")]
-            ]
+            keyboard = self._kb_cart_empty
         else:
             text = "🛒 *Ваша корзина:*\n\n"
-            total = 0
             
             for item in cart_items:
-                item_total = item.product_price * item.quantity
-                total += item_total
                 text += f"• {item.product_name}\n"
-                text += f"  {item.quantity} x {self.format_price(item.product_price)} = {self.format_price(item_total)}\n\n"
+                text += f"  {item.quantity} x {format_price(item.product_price)} = {format_price(item.line_total)}\n\n"
             
-            text += f"💰 *Итого: {self.format_price(total)}*"
+            text += f"💰 *Итого: {format_price(total)}*"
             
-            keyboard = [
-                [InlineKeyboardButton("🚚 Оформить заказ", callback_data="checkout")],
-                [InlineKeyboardButton("🗑️ Очистить корзину", callback_data="clear_cart")],
-                [InlineKeyboardButton("📋 Продолжить покупки", callback_data="catalog")],
-                [InlineKeyboardButton("🏠 Главная", callback_data="main_menu")]
-            ]
+            keyboard = self._kb_cart
         
         await query.edit_message_text(
             text,
             parse_mode=ParseMode.MARKDOWN,
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=keyboard
         )
         
         return CART_VIEW
@@ -748,7 +1025,7 @@ class FurnitureBot:
         await query.answer()
         
         user_id = query.from_user.id
-        self.db.clear_cart(user_id)
+        await self.db.clear_cart(user_id)
         
         await query.answer("🗑️ Корзина очищена", show_alert=True)
         return await self.show_cart(update, context)
@@ -759,15 +1036,11 @@ class FurnitureBot:
         await query.answer()
         
         user_id = query.from_user.id
-        cart_items = self.db.get_cart_items(user_id)
         
-        if not cart_items:
+        if not await self.db.get_cart_total(user_id):
             await query.answer("❌ Корзина пуста", show_alert=True)
             return await self.show_cart(update, context)
         
-        # Сохраняем данные заказа
-        context.user_data['order_items'] = cart_items
-        
         text = "📞 *Оформление заказа*\n\nВведите ваш номер телефона:"
         
         await query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN)
@@ -853,37 +1126,33 @@ class FurnitureBot:
         user_id = update.effective_user.id
         
         # Получаем данные заказа
-        cart_items = context.user_data.get('order_items', [])
+        cart_items, total = await self.db.get_cart_with_total(user_id)
         phone = context.user_data.get('order_phone', '')
         address = context.user_data.get('order_address', '')
         comment = context.user_data.get('order_comment', '')
         
         if not cart_items:
             text = "❌ Ошибка: корзина пуста"
-            keyboard = [[InlineKeyboardButton("🏠 Главная", callback_data="main_menu")]]
         else:
-            # Подготавливаем данные заказа
-            order_products = []
-            total = 0
-            
-            for item in cart_items:
-                order_products.append({
-                    'product_id': item.product_id,
-                    'name': item.product_name,
-                    'price': item.product_price,
-                    'quantity': item.quantity,
-                    'total': item.product_price * item.quantity
-                })
-                total += item.product_price * item.quantity
+            # Подготавливаем данные заказа (суммы уже посчитаны в базе)
+            order_products = [{
+                'product_id': item.product_id,
+                'name': item.product_name,
+                'price': item.product_price,
+                'quantity': item.quantity,
+                'total': item.line_total
+            } for item in cart_items]
             
-            # Создаем заказ
-            order_id = self.db.create_order(user_id, order_products, total, phone, address, comment)
-            
-            # Очищаем корзину
-            self.db.clear_cart(user_id)
+            # Создаем заказ и очищаем корзину
+            order_id = await self.db.create_order_and_clear(
+                user_id, order_products, total, phone, address, comment
+            )
             
-            # Уведомляем администраторов
-            await self.notify_admins_new_order(context, order_id, update.effective_user)
+            # Уведомляем администраторов в фоне, не задерживая ответ клиенту
+            context.application.create_task(
+                self.notify_admins_new_order(context, order_id, update.effective_user),
+                update=update
+            )
             
             text = f"""
 ✅ *Заказ #{order_id} успешно оформлен!*
@@ -892,55 +1161,55 @@ class FurnitureBot:
 📍 Адрес: {address}
 {f'💬 Комментарий: {comment}' if comment else ''}
 
-💰 *Сумма заказа: {self.format_price(total)}*
+💰 *Сумма заказа: {format_price(total)}*
 
 Наш менеджер свяжется с вами в ближайшее время для подтверждения заказа.
 
 Спасибо за покупку! 🙏
 """
-            
-            keyboard = [[InlineKeyboardButton("🏠 Главная", callback_data="main_menu")]]
         
         # Очищаем данные заказа
-        for key in ['order_items', 'order_phone', 'order_address', 'order_comment']:
+        for key in ['order_phone', 'order_address', 'order_comment']:
             context.user_data.pop(key, None)
         
         if query:
             await query.edit_message_text(
                 text,
                 parse_mode=ParseMode.MARKDOWN,
-                reply_markup=InlineKeyboardMarkup(keyboard)
+                reply_markup=self._kb_back_home
             )
         else:
             await update.message.reply_text(
                 text,
                 parse_mode=ParseMode.MARKDOWN,
-                reply_markup=InlineKeyboardMarkup(keyboard)
+                reply_markup=self._kb_back_home
             )
         
         return MAIN_MENU
     
     async def notify_admins_new_order(self, context: ContextTypes.DEFAULT_TYPE, order_id: int, user):
         """Уведомить администраторов о новом заказе"""
-        text = f"""
-🆕 *НОВЫЙ ЗАКАЗ #{order_id}*
-
-👤 Клиент: {user.first_name}
-📱 Username: @{user.username or 'Не указан'}
-🆔 ID: {user.id}
-
-Заказ ожидает обработки!
-"""
+        text = NEW_ORDER_TMPL.format(
+            order_id=order_id,
+            name=user.first_name,
+            username=user.username or 'Не указан',
+            id=user.id
+        )
         
-        for admin_id in ADMIN_IDS:
-            try:
-                await context.bot.send_message(
-                    chat_id=admin_id,
-                    text=text,
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            except Exception as e:
-                logger.error(f"Failed to notify admin {admin_id}: {e}")
+        # Отправляем всем администраторам одновременно
+        admin_ids = ADMIN_IDS_LIST
+        results = await asyncio.gather(
+            *(context.bot.send_message(
+                chat_id=admin_id,
+                text=text,
+                parse_mode=ParseMode.MARKDOWN
+            ) for admin_id in admin_ids),
+            return_exceptions=True
+        )
+        
+        for admin_id, result in zip(admin_ids, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to notify admin {admin_id}: {result}")
     
     async def show_profile(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Показать профиль пользователя"""
@@ -948,26 +1217,19 @@ class FurnitureBot:
         await query.answer()
         
         user = update.effective_user
-        db_user = self.db.get_user(user.id)
-        
-        text = f"""
-👤 *Ваш профиль*
-
-🆔 ID: {user.id}
-👤 Имя: {user.first_name or 'Не указано'}
-📱 Username: @{user.username or 'Не указан'}
-📞 Телефон: {db_user.phone or 'Не указан'}
-"""
+        db_user = await self.db.get_user(user.id)
         
-        keyboard = [
-            [InlineKeyboardButton("📞 Изменить телефон", callback_data="change_phone")],
-            [InlineKeyboardButton("🏠 Главная", callback_data="main_menu")]
-        ]
+        text = PROFILE_TMPL.format(
+            id=user.id,
+            name=user.first_name or 'Не указано',
+            username=user.username or 'Не указан',
+            phone=db_user.phone or 'Не указан'
+        )
         
         await query.edit_message_text(
             text,
             parse_mode=ParseMode.MARKDOWN,
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=self._kb_profile
         )
         
         return USER_PROFILE
@@ -979,7 +1241,7 @@ class FurnitureBot:
         query = update.callback_query
         await query.answer()
         
-        if not self.is_admin(query.from_user.id):
+        if not await self.is_admin(query.from_user.id):
             await query.answer("❌ Нет доступа", show_alert=True)
             return MAIN_MENU
         
@@ -1007,7 +1269,7 @@ class FurnitureBot:
         query = update.callback_query
         await query.answer()
         
-        if not self.is_admin(query.from_user.id):
+        if not await self.is_admin(query.from_user.id):
             await query.answer("❌ Нет доступа", show_alert=True)
             return ADMIN_MENU
         
@@ -1020,7 +1282,7 @@ class FurnitureBot:
         await query.edit_message_text(
             text,
             parse_mode=ParseMode.MARKDOWN,
-            reply_markup=self.get_categories_keyboard()
+            reply_markup=await self.get_categories_keyboard()
         )
         
         return CATALOG
@@ -1030,36 +1292,12 @@ class FurnitureBot:
         query = update.callback_query
         await query.answer()
         
-        if not self.is_admin(query.from_user.id):
+        if not await self.is_admin(query.from_user.id):
             await query.answer("❌ Нет доступа", show_alert=True)
             return ADMIN_MENU
         
         # Получаем статистику из базы
-        conn = sqlite3.connect(self.db.db_name)
-        cursor = conn.cursor()
-        
-        # Количество товаров
-        cursor.execute('SELECT COUNT(*) FROM products WHERE is_active = TRUE')
-        products_count = cursor.fetchone()[0]
-        
-        # Количество пользователей
-        cursor.execute('SELECT COUNT(*) FROM users')
-        users_count = cursor.fetchone()[0]
-        
-        # Количество заказов
-        cursor.execute('SELECT COUNT(*) FROM orders')
-        orders_count = cursor.fetchone()[0]
-        
-        # Товары по категориям
-        cursor.execute('''
-            SELECT category, COUNT(*) 
-            FROM products 
-            WHERE is_active = TRUE 
-            GROUP BY category
-        ''')
-        categories_stats = cursor.fetchall()
-        
-        conn.close()
+        products_count, users_count, orders_count, categories_stats = await self.db.get_stats()
         
         text = f"""
 📊 *Статистика магазина*
@@ -1074,15 +1312,10 @@ class FurnitureBot:
         for cat_name, count in categories_stats:
             text += f"• {cat_name}: {count} товаров\n"
         
-        keyboard = [
-            [InlineKeyboardButton("⚙️ Админ панель", callback_data="admin")],
-            [InlineKeyboardButton("🏠 Главная", callback_data="main_menu")]
-        ]
-        
         await query.edit_message_text(
             text,
             parse_mode=ParseMode.MARKDOWN,
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=self._kb_admin_back
         )
         
         return ADMIN_MENU
@@ -1092,56 +1325,36 @@ class FurnitureBot:
         query = update.callback_query
         await query.answer()
         
-        if not self.is_admin(query.from_user.id):
+        if not await self.is_admin(query.from_user.id):
             await query.answer("❌ Нет доступа", show_alert=True)
             return ADMIN_MENU
         
         # Получаем последние заказы
-        conn = sqlite3.connect(self.db.db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT o.id, o.total_amount, o.phone, o.created_at, o.status,
-                   u.first_name, u.username
-            FROM orders o
-            LEFT JOIN users u ON o.user_id = u.id
-            ORDER BY o.created_at DESC
-            LIMIT 10
-        ''')
-        
-        orders = cursor.fetchall()
-        conn.close()
+        orders = await self.db.get_recent_orders()
         
         if not orders:
             text = "📋 *Заказы*\n\nЗаказов пока нет."
         else:
-            text = "📋 *Последние заказы:*\n\n"
+            parts = ["📋 *Последние заказы:*\n\n"]
             
             for order in orders:
-                order_id, total, phone, created_at, status, first_name, username = order
+                order_id, total, phone, date, status, first_name, username = order
                 
-                # Форматируем дату
-                try:
-                    date = datetime.fromisoformat(created_at).strftime("%d.%m.%Y %H:%M")
-                except:
-                    date = created_at
-                
-                text += f"🆔 Заказ #{order_id}\n"
-                text += f"👤 {first_name or 'Неизвестно'} (@{username or 'нет'})\n"
-                text += f"💰 {self.format_price(total)}\n"
-                text += f"📞 {phone}\n"
-                text += f"📅 {date}\n"
-                text += f"🟢 Статус: {status}\n\n"
-        
-        keyboard = [
-            [InlineKeyboardButton("⚙️ Админ панель", callback_data="admin")],
-            [InlineKeyboardButton("🏠 Главная", callback_data="main_menu")]
-        ]
+                parts.append(
+                    f"🆔 Заказ #{order_id}\n"
+                    f"👤 {first_name or 'Неизвестно'} (@{username or 'нет'})\n"
+                    f"💰 {format_price(total)}\n"
+                    f"📞 {phone}\n"
+                    f"📅 {date}\n"
+                    f"🟢 Статус: {status}\n\n"
+                )
+            
+            text = "".join(parts)
         
         await query.edit_message_text(
             text,
             parse_mode=ParseMode.MARKDOWN,
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=self._kb_admin_back
         )
         
         return ADMIN_MENU
@@ -1151,7 +1364,7 @@ class FurnitureBot:
         query = update.callback_query
         await query.answer()
         
-        if not self.is_admin(query.from_user.id):
+        if not await self.is_admin(query.from_user.id):
             await query.answer("❌ Нет доступа", show_alert=True)
             return ADMIN_MENU
         
@@ -1212,7 +1425,7 @@ class FurnitureBot:
         context.user_data['new_product'].price = price
         
         # Показываем категории
-        categories = self.db.get_categories()
+        categories = await self.db.get_categories()
         keyboard = []
         
         for cat in categories:
@@ -1222,7 +1435,7 @@ class FurnitureBot:
             )])
         
         await update.message.reply_text(
-            f"✅ Цена: {self.format_price(price)}\n\nВыберите категорию:",
+            f"✅ Цена: {format_price(price)}\n\nВыберите категорию:",
             parse_mode=ParseMode.MARKDOWN,
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
@@ -1259,9 +1472,7 @@ class FurnitureBot:
             return await self.save_new_product(update, context)
         
         if update.message.photo:
-            # Получаем файл изображения
             photo = update.message.photo[-1]  # Берем самое большое изображение
-            file = await context.bot.get_file(photo.file_id)
             
             # Сохраняем file_id как ссылку на изображение
             context.user_data['new_product'].images.append(photo.file_id)
@@ -1285,13 +1496,13 @@ class FurnitureBot:
             text = "❌ Ошибка: данные товара не найдены"
         else:
             try:
-                product_id = self.db.save_product(product)
+                product_id = await self.db.save_product(product)
                 text = f"""
 ✅ *Товар успешно добавлен!*
 
 🆔 ID: {product_id}
 📦 Название: {product.name}
-💰 Цена: {self.format_price(product.price)}
+💰 Цена: {format_price(product.price)}
 🏷️ Категория: {product.category}
 🖼️ Изображений: {len(product.images)}
 
@@ -1330,12 +1541,12 @@ class FurnitureBot:
         query = update.callback_query
         await query.answer()
         
-        if not self.is_admin(query.from_user.id):
+        if not await self.is_admin(query.from_user.id):
             await query.answer("❌ Нет доступа", show_alert=True)
             return PRODUCT_VIEW
         
         product_id = int(query.data.replace("delete_product_", ""))
-        product = self.db.get_product_by_id(product_id)
+        product = await self.db.get_product_by_id(product_id)
         
         if not product:
             await query.answer("❌ Товар не найден", show_alert=True)
@@ -1347,7 +1558,7 @@ class FurnitureBot:
         ]
         
         await query.edit_message_text(
-            f"🗑️ *Удаление товара*\n\nВы уверены, что хотите удалить:\n\n📦 {product.name}\n💰 {self.format_price(product.price)}",
+            f"🗑️ *Удаление товара*\n\nВы уверены, что хотите удалить:\n\n📦 {product.name}\n💰 {product.formatted_price}",
             parse_mode=ParseMode.MARKDOWN,
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
@@ -1362,15 +1573,15 @@ class FurnitureBot:
         product_id = int(query.data.replace("confirm_delete_", ""))
         
         try:
-            product = self.db.get_product_by_id(product_id)
-            self.db.delete_product(product_id)
+            product = await self.db.get_product_by_id(product_id)
+            await self.db.delete_product(product_id)
             await query.answer("✅ Товар удален", show_alert=True)
             
             # Возвращаемся к категории
             category = context.user_data.get('current_category', product.category if product else None)
             if category:
                 # Показываем обновленный список товаров
-                products = self.db.get_products_by_category(category)
+                products = await self.db.get_products_by_category(category)
                 
                 if not products:
                     text = f"📋 *{category}*\n\nВ этой категории больше нет товаров."
@@ -1380,7 +1591,7 @@ class FurnitureBot:
                 await query.edit_message_text(
                     text,
                     parse_mode=ParseMode.MARKDOWN,
-                    reply_markup=self.get_products_keyboard(category, 0)
+                    reply_markup=await self.get_products_keyboard(category, 0, products)
                 )
                 return CATALOG
             else:
@@ -1400,7 +1611,7 @@ class FurnitureBot:
         category = context.user_data.get('current_category')
         if category:
             # Возвращаемся к товарам текущей категории
-            products = self.db.get_products_by_category(category)
+            products = await self.db.get_products_by_category(category)
             
             if not products:
                 text = f"📋 *{category}*\n\nВ этой категории пока нет товаров."
@@ -1410,7 +1621,7 @@ class FurnitureBot:
             await query.edit_message_text(
                 text,
                 parse_mode=ParseMode.MARKDOWN,
-                reply_markup=self.get_products_keyboard(category, 0)
+                reply_markup=await self.get_products_keyboard(category, 0, products)
             )
             return CATALOG
         else:
@@ -1429,39 +1640,40 @@ class FurnitureBot:
     
     async def error_handler(self, update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Обработчик ошибок"""
-        logger.error(f"Update {update} caused error {context.error}")
-        
-        # Получаем детали ошибки
-        import traceback
-        tb_string = ''.join(traceback.format_exception(type(context.error), context.error, context.error.__traceback__))
-        logger.error(f"Full traceback:\n{tb_string}")
+        # Трассировка формируется модулем logging только при выводе записи
+        logger.error("Update %s caused error", update, exc_info=context.error)
         
         if isinstance(update, Update) and update.effective_message:
             try:
                 # Определяем тип ошибки для пользователя
+                # TimedOut и BadRequest наследуются от NetworkError, поэтому проверяются раньше
+                error = context.error
                 error_msg = "❌ Произошла ошибка. "
                 
-                if "timeout" in str(context.error).lower():
+                if isinstance(error, TimedOut):
                     error_msg += "Превышено время ожидания. Попробуйте еще раз."
-                elif "network" in str(context.error).lower():
-                    error_msg += "Проблема с сетью. Попробуйте позже."
-                elif "file_id" in str(context.error).lower():
+                elif isinstance(error, BadRequest) and "file" in str(error).lower():
                     error_msg += "Проблема с изображением. Попробуйте загрузить другое."
+                elif isinstance(error, NetworkError) and not isinstance(error, BadRequest):
+                    error_msg += "Проблема с сетью. Попробуйте позже."
                 else:
                     error_msg += "Попробуйте еще раз или обратитесь к администратору."
                 
-                keyboard = [
-                    [InlineKeyboardButton("🏠 Главная", callback_data="main_menu")],
-                    [InlineKeyboardButton("📋 Каталог", callback_data="catalog")]
-                ]
-                
                 await update.effective_message.reply_text(
                     error_msg,
-                    reply_markup=InlineKeyboardMarkup(keyboard)
+                    reply_markup=self._kb_error
                 )
             except Exception as e:
                 logger.error(f"Error in error handler: {e}")
 
+async def post_init(application: Application) -> None:
+    """Открываем соединение с базой данных при запуске"""
+    await db.connect()
+
+async def post_shutdown(application: Application) -> None:
+    """Закрываем соединение с базой данных при остановке"""
+    await db.close()
+
 def main():
     """Главная функция запуска бота"""
     
@@ -1478,7 +1690,13 @@ def main():
     bot = FurnitureBot()
     
     # Создаем приложение
-    application = Application.builder().token(BOT_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     
     # Настройка диалогов
     conversation_handler = ConversationHandler(
@@ -1491,10 +1709,11 @@ def main():
                 CallbackQueryHandler(bot.admin_menu, pattern="^admin$"),
             ],
             CATALOG: [
+                # Самые частые нажатия проверяются первыми
+                # Отправка фото товара долгая — не задерживаем остальные обновления
+                CallbackQueryHandler(bot.show_product, pattern="^product_", block=False),
+                CallbackQueryHandler(bot.show_category, pattern=r"^(c\d+|p\d+:\d+)$"),
                 CallbackQueryHandler(bot.main_menu, pattern="^main_menu$"),
-                CallbackQueryHandler(bot.show_category, pattern="^category_"),
-                CallbackQueryHandler(bot.show_category, pattern="^products_"),
-                CallbackQueryHandler(bot.show_product, pattern="^product_"),
             ],
             PRODUCT_VIEW: [
                 CallbackQueryHandler(bot.add_to_cart, pattern="^add_cart_"),
@@ -1560,13 +1779,13 @@ def main():
     # Информация о запуске
     logger.info("🚀 Бот запущен!")
     logger.info(f"📊 База данных: {DB_NAME}")
-    logger.info(f"👥 Администраторы: {ADMIN_IDS}")
+    logger.info(f"👥 Администраторы: {', '.join(map(str, ADMIN_IDS_LIST))}")
     logger.info("🌐 Режим: Railway Cloud Hosting")
     
     # Запускаем бота
     try:
         application.run_polling(
-            allowed_updates=Update.ALL_TYPES,
+            allowed_updates=[Update.MESSAGE, Update.CALLBACK_QUERY],  # Бот обрабатывает только сообщения и кнопки
             drop_pending_updates=True  # Игнорируем старые обновления при запуске
         )
     except Exception as e: